@@ -1,10 +1,19 @@
 import gspread
 from google.oauth2.service_account import Credentials
+from collections import OrderedDict
 from datetime import datetime
+import copy
+import hashlib
+import json
+import logging
+import os
 import re
+import threading
+import time
 
 CREDENTIALS_FILE = 'uplifted-light-432518-k5-8d2823e4c54e.json'
 SHEET_NAME = 'Trade'
+logger = logging.getLogger(__name__)
 
 def coletar_dados():
     scope = ['https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/drive.readonly']
@@ -32,14 +41,14 @@ def coletar_dados():
         winrate_raw = winrate_raw.replace(",", ".")
         try:
             winrate = float(winrate_raw)
-            print(f"Winrate importado {winrate_raw}")
+            logger.debug("[ANALISADOR] Winrate importado %s", winrate_raw)
             horarios_info.append({
                 "horario": horario,
                 "winrate": winrate                
             })
         
         except:
-            print(f"[ANALISADOR] ❌ Ignorado horário '{horario}': winrate inválido '{linha[1]}'")
+            logger.warning("[ANALISADOR] ❌ Ignorado horário '%s': winrate inválido '%s'", horario, linha[1])
         
     # NOVO: Coletar ativos e winrate geral (J3:K16)
     ativos_winrate_geral = []
@@ -56,7 +65,7 @@ def coletar_dados():
                 "winrate": winrate
             })
         except:
-            print(f"[ANALISADOR] ❌ Ignorado ativo '{nome}': winrate inválido '{linha[1]}'")
+            logger.warning("[ANALISADOR] ❌ Ignorado ativo '%s': winrate inválido '%s'", nome, linha[1])
 
     noticias_lidas = []
     noticias = aba_noticias.get_all_values()[1:]
@@ -72,7 +81,7 @@ def coletar_dados():
             "noticia": noticia
         })
 
-    return {
+    dados = {
         "melhores_ativos": melhores_ativos,
         "piores_ativos": piores_ativos,
         "horarios_info": horarios_info,
@@ -80,6 +89,146 @@ def coletar_dados():
         "ativos_winrate_geral": ativos_winrate_geral,
         "noticias": noticias_lidas
     }
+    dados["versao"] = calcular_versao_dados(dados)
+    return dados
+
+
+def calcular_versao_dados(dados_coletados):
+    # Impressão digital do snapshot da planilha/notícias; muda quando qualquer valor muda
+    conteudo = {k: v for k, v in dados_coletados.items() if k != "versao"}
+    serializado = json.dumps(conteudo, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(serializado.encode("utf-8")).hexdigest()
+
+
+_dados_lock = threading.Lock()
+_dados_cache = None
+_dados_coletados_em = 0.0
+
+
+def coletar_dados_em_cache(ttl=None):
+    """coletar_dados() reaproveitado por `ttl` segundos (ANALISE_DADOS_TTL, padrão 60)."""
+    global _dados_cache, _dados_coletados_em
+    ttl = float(os.getenv("ANALISE_DADOS_TTL", "60")) if ttl is None else ttl
+    with _dados_lock:
+        if _dados_cache is None or time.monotonic() - _dados_coletados_em >= ttl:
+            _dados_cache = coletar_dados()
+            _dados_coletados_em = time.monotonic()
+        return _dados_cache
+
+
+def invalidar_dados():
+    """Força nova leitura da planilha na próxima análise (ex.: depois de gravar na Auto ou no calendário)."""
+    global _dados_cache
+    with _dados_lock:
+        _dados_cache = None
+
+
+def _chave_sinal(ativo, horario_str, direcao):
+    try:
+        minuto = datetime.strptime(horario_str.strip(), "%H:%M:%S").strftime("%H:%M")
+    except (ValueError, AttributeError):
+        return None
+    direcao = direcao.strip().upper() if direcao else None
+    return (ativo.strip().upper(), minuto, direcao)
+
+
+class CacheAnalises:
+    """LRU das análises por (ativo, minuto, direção, versão dos dados).
+
+    Quando a versão do snapshot muda, todas as entradas são descartadas.
+    Serve só para reaproveitar a análise; quem decide se o alerta já foi
+    enviado é AlertasEnviados.
+    """
+
+    def __init__(self, tamanho_max=256):
+        self.tamanho_max = tamanho_max
+        self.versao = None
+        self.hits = 0
+        self.misses = 0
+        self._entradas = OrderedDict()
+
+    def analisar(self, ativo, horario_str, dados_coletados, direcao=None):
+        """Retorna uma cópia dos resultados, para que o chamador possa alterá-los sem afetar o cache."""
+        versao = dados_coletados.get("versao") or calcular_versao_dados(dados_coletados)
+        if versao != self.versao:
+            self._entradas.clear()
+            self.versao = versao
+
+        chave_sinal = _chave_sinal(ativo, horario_str, direcao)
+        if chave_sinal is None:
+            return analisar_sinal(ativo, horario_str, dados_coletados, direcao=direcao)
+        chave = chave_sinal + (versao,)
+
+        if chave in self._entradas:
+            self._entradas.move_to_end(chave)
+            self.hits += 1
+            logger.info(f"[ANALISADOR] ♻ Análise em cache para '{chave[0]}' às {chave[1]}",
+                        extra={"campos": {"ativo": chave[0], "minuto": chave[1], "hits": self.hits, "misses": self.misses}})
+            return copy.deepcopy(self._entradas[chave])
+
+        self.misses += 1
+        resultados = analisar_sinal(ativo, horario_str, dados_coletados, direcao=direcao)
+        self._entradas[chave] = copy.deepcopy(resultados)
+        if len(self._entradas) > self.tamanho_max:
+            self._entradas.popitem(last=False)
+        return resultados
+
+    def limpar(self):
+        self._entradas.clear()
+        self.versao = None
+
+    def estatisticas(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "tamanho": len(self._entradas),
+            "versao": self.versao
+        }
+
+
+class AlertasEnviados:
+    """Conjunto limitado de (ativo, minuto, direção) que já geraram alerta.
+
+    Independe do cache de análises: mudar a planilha ou despejar uma análise
+    não faz o mesmo sinal ser alertado de novo.
+    """
+
+    def __init__(self, tamanho_max=1024):
+        self.tamanho_max = tamanho_max
+        self._lock = threading.Lock()
+        self._chaves = OrderedDict()
+
+    def marcar(self, ativo, horario_str, direcao=None):
+        """Registra o sinal; retorna False se ele já tinha sido alertado."""
+        chave = _chave_sinal(ativo, horario_str, direcao)
+        if chave is None:
+            return True
+        with self._lock:
+            if chave in self._chaves:
+                self._chaves.move_to_end(chave)
+                return False
+            self._chaves[chave] = None
+            if len(self._chaves) > self.tamanho_max:
+                self._chaves.popitem(last=False)
+            return True
+
+    def desmarcar(self, ativo, horario_str, direcao=None):
+        """Libera o sinal de novo (ex.: o envio do alerta falhou depois do `marcar`)."""
+        chave = _chave_sinal(ativo, horario_str, direcao)
+        with self._lock:
+            self._chaves.pop(chave, None)
+
+    def limpar(self):
+        with self._lock:
+            self._chaves.clear()
+
+
+cache_analises = CacheAnalises(int(os.getenv("ANALISE_CACHE_SIZE", "256")))
+alertas_enviados = AlertasEnviados(int(os.getenv("ALERTAS_ENVIADOS_SIZE", "1024")))
+
+
+def analisar_sinal_com_cache(ativo, horario_str, dados_coletados, direcao=None):
+    return cache_analises.analisar(ativo, horario_str, dados_coletados, direcao=direcao)
 
 
 def analisar_sinal(ativo, horario_str, dados_coletados,direcao=None):
@@ -101,7 +250,7 @@ def analisar_sinal(ativo, horario_str, dados_coletados,direcao=None):
 
     except:
         texto = f"[ANALISADOR] ❌ Erro: Horário do sinal inválido '{horario_str}'"
-        print(texto)
+        logger.warning(texto)
         criterios.append(texto)
         return []
 
@@ -114,22 +263,22 @@ def analisar_sinal(ativo, horario_str, dados_coletados,direcao=None):
     for h in horarios_info:
         if h["horario"].strip() == hora_sinal:
             winrate_horario = h["winrate"]
-            print(f"[ANALISADOR] ✅ Winrate do horário {hora_sinal} encontrado: {winrate_horario}")
+            logger.debug("[ANALISADOR] ✅ Winrate do horário %s encontrado: %s", hora_sinal, winrate_horario)
             break
     else:
-        print(f"[ANALISADOR] ⚠ Nenhum winrate encontrado para o horário {hora_sinal}")
+        logger.debug("[ANALISADOR] ⚠ Nenhum winrate encontrado para o horário %s", hora_sinal)
     
 
 
     if ativo in piores_ativos:
         score -= 1
         texto = f"[ANALISADOR] ⚠ Ativo '{ativo}' está entre os piores"
-        print(texto)
+        logger.debug(texto)
         criterios.append(texto)
     elif ativo in melhores_ativos:
         score += 1
         texto = f"[ANALISADOR] ✅ Ativo '{ativo}' está entre os melhores"
-        print(texto)
+        logger.debug(texto)
         criterios.append(texto)
 
     piores_horarios = [h["horario"] for h in horarios_info if h["winrate"] < 80.0]
@@ -137,13 +286,13 @@ def analisar_sinal(ativo, horario_str, dados_coletados,direcao=None):
     if any(horario_sinal.strftime("%H:%M") == h for h in piores_horarios):
         score -= 1
         texto = f"[ANALISADOR] ⚠ Horário '{horario_sinal.strftime('%H:%M')}' está entre os piores"
-        print(texto)
+        logger.debug(texto)
         criterios.append(texto)
     else:
         if ativo in melhores_ativos:
             score += 1
             texto = f"[ANALISADOR] ✅ Ativo bom e horário não ruim "
-            print(texto)
+            logger.debug(texto)
             criterios.append(texto)
 
     maior_impacto_atingindo = 0
@@ -186,36 +335,31 @@ def analisar_sinal(ativo, horario_str, dados_coletados,direcao=None):
     if maior_impacto_atingindo > 1:
         score -= 1
         texto = f"[ANALISADOR] ⚠ Notícia impacto {maior_impacto_atingindo} próxima"
-        print(texto)
+        logger.debug(texto)
         criterios.append(texto)
         noticias_proximas.append(texto)
 
         texto = f"📰 Impactando:\n {noticia_impacto['horario']} | {noticia_impacto['moeda']} | Impacto {noticia_impacto['impacto']} |\n {noticia_impacto['noticia']}"
-        print(texto)
+        logger.debug(texto)
         noticias_proximas.append(texto)
 
     if noticia_passada:
         texto = f"🕒 Última notícia antes ou no sinal:\n {noticia_passada['horario']} | {noticia_passada['moeda']} | Impacto {noticia_passada['impacto']} |\n {noticia_passada['noticia']}"
     else:
         texto = "🕒? Nenhuma notícia antes ou no sinal."
-    print(texto)
+    logger.debug(texto)
     noticias_proximas.append(texto)
 
     if noticia_futura:
         texto = f"🕒 Próxima notícia após o sinal:\n {noticia_futura['horario']} | {noticia_futura['moeda']} | Impacto {noticia_futura['impacto']} |\n {noticia_futura['noticia']}"
     else:
         texto = "🕒? Nenhuma notícia após o sinal."
-    print(texto)
+    logger.debug(texto)
     noticias_proximas.append(texto)
 
-    print(f"[ANALISADOR] 🎯 Score final do sinal '{ativo}' às {horario_sinal.strftime('%H:%M:%S')}: {score}")
-
-    print("\n[ANALISADOR] ✅ Critérios aplicados:")
-    for c in criterios:
-        print(f"- {c}")
-    print("\n[ANALISADOR] 📰 Notícias próximas:")
-    for n in noticias_proximas:
-        print(f"{n}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("[ANALISADOR] ✅ Critérios aplicados:\n%s", "\n".join(f"- {c}" for c in criterios))
+        logger.debug("[ANALISADOR] 📰 Notícias próximas:\n%s", "\n".join(noticias_proximas))
 
     if score == 1:
         recomendacao = "✅ RECOMENDADO"
@@ -226,6 +370,10 @@ def analisar_sinal(ativo, horario_str, dados_coletados,direcao=None):
     else:
         recomendacao = "⚠️ NÃO RECOMENDADO"
 
+    logger.info(f"[ANALISADOR] 🎯 Score final do sinal '{ativo}' às {horario_sinal.strftime('%H:%M:%S')}: {score}",
+                extra={"campos": {"ativo": ativo, "horario": horario_sinal.strftime('%H:%M:%S'), "direcao": direcao,
+                                  "score": score, "recomendacao": recomendacao}})
+
     return [{
         "ativo": ativo,
         "horario": horario_sinal.strftime('%H:%M:%S'),
@@ -1,18 +1,26 @@
 import asyncio
+import csv
 import logging
 import os
 import re
+import time
 import gspread
 import pytz
 from datetime import datetime, timedelta
 from typing import List, Optional, Set, Tuple
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
 from google.oauth2.service_account import Credentials
 from envio_resultado import enviar_telegram
-from analisador import coletar_dados, analisar_sinal
+from analisador import coletar_dados, coletar_dados_em_cache, invalidar_dados, analisar_sinal, analisar_sinal_com_cache, alertas_enviados
+from outbox import SheetsOutbox, shared_outbox
+from log_estruturado import configurar_logging_worker, ultima_linha
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
+
+# O journal tem thread própria: chamadas lentas ao Sheets no executor padrão não o atrasam
+_outbox_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="outbox")
 
 @dataclass
 class Signal:
@@ -29,6 +37,91 @@ class Signal:
     def get_key(self) -> Tuple[str, str]:
         return (self.data, self.horario)
 
+
+SIGNAL_PATTERN = re.compile(
+    r'(?:✅|❌)?(?:¹|²)?[\s\S]*?(?:Ativo:\s*([A-Z0-9\-]+)[\s\S]*?Horário:\s*(\d{2}:\d{2}:\d{2})[\s\S]*?Direção:\s*(call|put)'
+    r'|([A-Z0-9\-]+)\s*-\s*(\d{2}:\d{2}:\d{2})\s*-\s*M1\s*-\s*(call|put)\s*-\s*(WIN|LOSS))',
+    re.IGNORECASE
+)
+
+
+def parse_signal_text(text: str, pattern=SIGNAL_PATTERN) -> Optional[Signal]:
+    match = pattern.search(text)
+    if not match:
+        return None
+    try:
+        if match.group(1):
+            ativo, horario, direcao = match.group(1), match.group(2), match.group(3)
+            gale = 0
+            if '¹' in text:
+                gale = 1
+            elif '²' in text:
+                gale = 2
+            return Signal(horario=horario.strip(), ativo=ativo.strip().upper(), direcao=direcao.strip().upper(), resultado="PENDENTE", gale=gale)
+        elif match.group(4):
+            ativo, horario, direcao, resultado = match.group(4), match.group(5), match.group(6), match.group(7)
+            gale = 0
+            if '¹' in text:
+                gale = 1
+            elif '²' in text:
+                gale = 2
+            return Signal(horario=horario.strip(), ativo=ativo.strip().upper(), direcao=direcao.strip().upper(), resultado=resultado.strip().upper(), gale=gale)
+    except Exception as e:
+        logger.error(f"[COLETA] Erro ao interpretar sinal: {e}")
+        return None
+
+
+def adjust_signal_date(signal: Signal, message_date: datetime):
+    """Sinal com horário depois do da mensagem pertence ao dia anterior."""
+    try:
+        signal_hour = datetime.strptime(signal.horario, "%H:%M:%S").time()
+        msg_hour = message_date.time()
+        if signal_hour > msg_hour:
+            signal.data = (message_date - timedelta(days=1)).strftime("%d/%m/%Y")
+        else:
+            signal.data = message_date.strftime("%d/%m/%Y")
+    except Exception as e:
+        logger.error(f"Erro ao ajustar data do sinal: {e}")
+        signal.data = message_date.strftime("%d/%m/%Y")
+
+
+def chronological_key(data: str, horario: str) -> datetime:
+    """Chave de ordenação cronológica para (data, horario) da aba Auto; inválidos vão para o início."""
+    try:
+        return datetime.strptime(f"{data} {horario}", "%d/%m/%Y %H:%M:%S")
+    except ValueError:
+        return datetime.min
+
+
+def _init_backfill_worker(nivel: int):
+    """Initializer do pool do backfill: logs dos workers vão direto para o stderr."""
+    configurar_logging_worker(nivel)
+    # O score de cada sinal vai para o CSV; o log por sinal do analisador só faria ruído
+    logging.getLogger("analisador").setLevel(logging.WARNING)
+
+
+def _process_backfill_chunk(messages, timezone_name: str, dados_coletados=None):
+    """Executado nos processos do pool: interpreta, ajusta a data e pontua um lote de mensagens.
+
+    Retorna (resultados, segundos de CPU gastos no lote).
+    """
+    started = time.process_time()
+    timezone = pytz.timezone(timezone_name)
+    results = []
+    for message_id, text, date in messages:
+        signal = parse_signal_text(text)
+        if not signal or signal.resultado not in ("WIN", "LOSS"):
+            continue
+        adjust_signal_date(signal, date.astimezone(timezone))
+        analise = None
+        if dados_coletados:
+            resultado = analisar_sinal(signal.ativo, signal.horario, dados_coletados, direcao=signal.direcao)
+            if resultado:
+                analise = (resultado[0]["score"], resultado[0]["recomendacao"])
+        results.append((message_id, signal, analise))
+    return results, time.process_time() - started
+
+
 class TelegramSignalCollector:
     def __init__(self, signals_to_collect: int, client):
         self.client = client
@@ -39,82 +132,297 @@ class TelegramSignalCollector:
         self.worksheet_name = os.getenv('WORKSHEET_NAME', 'Auto')
 
         self.batch_size = int(os.getenv('BATCH_SIZE', '100'))
+        self.max_rows = int(os.getenv('AUTO_MAX_ROWS', '500'))
+        self._outbox = None
+        self.outbox_batch_size = int(os.getenv('OUTBOX_BATCH_SIZE', '500'))
+        self.sheets_timeout = float(os.getenv('SHEETS_TIMEOUT', '60'))
+        self.sheets_retries = int(os.getenv('SHEETS_RETRIES', '3'))
+        self.retry_backoff = float(os.getenv('SHEETS_RETRY_BACKOFF', '2'))
         self.timezone = pytz.timezone(os.getenv('TIMEZONE', 'UTC'))
 
         self.signals_to_collect = signals_to_collect
         self.total_messages_to_fetch = self.signals_to_collect * 2
 
-        self.signal_pattern = re.compile(
-            r'(?:✅|❌)?(?:¹|²)?[\s\S]*?(?:Ativo:\s*([A-Z0-9\-]+)[\s\S]*?Horário:\s*(\d{2}:\d{2}:\d{2})[\s\S]*?Direção:\s*(call|put)'
-            r'|([A-Z0-9\-]+)\s*-\s*(\d{2}:\d{2}:\d{2})\s*-\s*M1\s*-\s*(call|put)\s*-\s*(WIN|LOSS))',
-            re.IGNORECASE
-        )
+        self.signal_pattern = SIGNAL_PATTERN
         self.worksheet = None
 
+    @property
+    def outbox(self) -> SheetsOutbox:
+        # Aberto só quando usado: o handler de mensagens não precisa do journal
+        if self._outbox is None:
+            self._outbox = abrir_outbox()
+        return self._outbox
+
     async def initialize_sheets(self):
         def _sheets():
             scope = ['https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/drive.readonly']
             credentials = Credentials.from_service_account_file(str(self.credentials_file), scopes=scope)
             gc = gspread.authorize(credentials)
+            # Timeout no cliente HTTP: a chamada termina de fato, em vez de seguir gravando numa thread abandonada
+            gc.set_timeout(self.sheets_timeout)
             sheet = gc.open(self.sheet_name)
             return sheet.worksheet(self.worksheet_name)
         loop = asyncio.get_event_loop()
         self.worksheet = await loop.run_in_executor(None, _sheets)
 
     def parse_signal(self, text: str) -> Optional[Signal]:
-        match = self.signal_pattern.search(text)
-        if not match:
-            return None
-        try:
-            if match.group(1):
-                ativo, horario, direcao = match.group(1), match.group(2), match.group(3)
-                gale = 0
-                if '¹' in text:
-                    gale = 1
-                elif '²' in text:
-                    gale = 2
-                return Signal(horario=horario.strip(), ativo=ativo.strip().upper(), direcao=direcao.strip().upper(), resultado="PENDENTE", gale=gale)
-            elif match.group(4):
-                ativo, horario, direcao, resultado = match.group(4), match.group(5), match.group(6), match.group(7)
-                gale = 0
-                if '¹' in text:
-                    gale = 1
-                elif '²' in text:
-                    gale = 2
-                return Signal(horario=horario.strip(), ativo=ativo.strip().upper(), direcao=direcao.strip().upper(), resultado=resultado.strip().upper(), gale=gale)
-        except Exception as e:
-            logger.error(f"[COLETA] Erro ao interpretar sinal: {e}")
-            return None
-
+        return parse_signal_text(text, self.signal_pattern)
 
     async def collect_and_save(self):
-        await self.initialize_sheets()
-        logger.info(f"[COLETA] Buscando as últimas {self.total_messages_to_fetch} mensagens...")
+        loop = asyncio.get_running_loop()
+        min_id = await loop.run_in_executor(_outbox_executor, self.outbox.last_message_id)
+        logger.info(f"[COLETA] Buscando as últimas {self.total_messages_to_fetch} mensagens (após id {min_id})...")
         signals = []
         seen_signals = set()
-        async for message in self.client.iter_messages(self.group_id, limit=self.total_messages_to_fetch):
+        last_id = min_id
+        async for message in self.client.iter_messages(self.group_id, limit=self.total_messages_to_fetch, min_id=min_id):
+            last_id = max(last_id, message.id)
             message_date = message.date.astimezone(self.timezone)
             if message.message:
                 signal = self.parse_signal(message.message)
                 if signal and signal.resultado.upper() in ("WIN", "LOSS"):
-                    try:
-                        signal_hour = datetime.strptime(signal.horario, "%H:%M:%S").time()
-                        msg_hour = message_date.time()
-                        if signal_hour > msg_hour:
-                            signal.data = (message_date - timedelta(days=1)).strftime("%d/%m/%Y")
-                        else:
-                            signal.data = message_date.strftime("%d/%m/%Y")
-                    except Exception as e:
-                        logger.error(f"Erro ao ajustar data do sinal: {e}")
-                        signal.data = message_date.strftime("%d/%m/%Y")
+                    adjust_signal_date(signal, message_date)
                     key = signal.get_key()
                     if key not in seen_signals:
                         seen_signals.add(key)
                         signals.append(signal)
         logger.info(f"[COLETA] Total de sinais válidos encontrados (WIN/LOSS): {len(signals)}")
-        await self.save_signals(signals)
+        # As mensagens chegam da mais nova para a mais antiga; a aba Auto é cronológica
+        # (a limpeza mantém as últimas linhas e a última linha é o último sinal)
+        signals.sort(key=lambda sig: chronological_key(sig.data, sig.horario))
+        # Journal primeiro: a partir daqui os sinais sobrevivem a falhas do Sheets e a reinícios
+        await loop.run_in_executor(_outbox_executor, self.outbox.record, signals, last_id)
+
+        if _flush_event is not None:
+            _flush_event.set()
+        else:
+            await self.flush_outbox()
+
+    async def backfill(self, total_messages: int, workers: Optional[int] = None,
+                       chunk_size: int = 1000, score: bool = False,
+                       scores_file: str = "backfill_scores.csv") -> dict:
+        """Reprocessa um histórico grande em paralelo e regrava a aba Auto.
+
+        O texto das mensagens é enviado em lotes para um pool de processos
+        (parse + ajuste de data + score opcional); os resultados são unidos e
+        deduplicados por (data, horario), mantendo a mensagem mais recente.
+        Os sinais passam pelo outbox e a aba é regravada de uma vez com as
+        últimas `max_rows` linhas em ordem cronológica. Com `score`, o score e
+        a recomendação de cada sinal vão para `scores_file` (CSV).
+        """
+        workers = workers or os.cpu_count() or 1
+        loop = asyncio.get_running_loop()
+        stats = {"messages": 0, "signals": 0, "workers": workers, "parse_cpu_seconds": 0.0}
+
+        dados = None
+        if score:
+            started = time.perf_counter()
+            dados = await loop.run_in_executor(None, coletar_dados)
+            stats["load_seconds"] = time.perf_counter() - started
+
+        merged = {}
+        scores = Counter()
+
+        def _merge(done):
+            for future in done:
+                results, cpu_seconds = future.result()
+                stats["parse_cpu_seconds"] += cpu_seconds
+                for message_id, signal, analise in results:
+                    key = signal.get_key()
+                    if key not in merged or message_id > merged[key][0]:
+                        merged[key] = (message_id, signal, analise)
+
+        logger.info(f"[BACKFILL] Processando até {total_messages} mensagens com {workers} workers (lotes de {chunk_size})...")
+        started = time.perf_counter()
+        waited = 0.0
+        last_id = 0
+        pending = set()
+        nivel = logging.getLogger().getEffectiveLevel()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_backfill_worker, initargs=(nivel,)) as pool:
+            chunk = []
+            async for message in self.client.iter_messages(self.group_id, limit=total_messages):
+                stats["messages"] += 1
+                last_id = max(last_id, message.id)
+                if message.message:
+                    chunk.append((message.id, message.message, message.date))
+                if len(chunk) >= chunk_size:
+                    pending.add(loop.run_in_executor(pool, _process_backfill_chunk, chunk, self.timezone.zone, dados))
+                    chunk = []
+                    # Limita os lotes em voo para não acumular o histórico inteiro na memória
+                    if len(pending) >= workers * 2:
+                        wait_started = time.perf_counter()
+                        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                        waited += time.perf_counter() - wait_started
+                        _merge(done)
+            # Só o tempo da leitura em si, sem as esperas pelo pool
+            stats["fetch_seconds"] = time.perf_counter() - started - waited
+            if chunk:
+                pending.add(loop.run_in_executor(pool, _process_backfill_chunk, chunk, self.timezone.zone, dados))
+            if pending:
+                done, _ = await asyncio.wait(pending)
+                _merge(done)
+        stats["pipeline_seconds"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        ordered = sorted(merged.values(), key=lambda item: chronological_key(item[1].data, item[1].horario))
+        signals = [signal for _, signal, _ in ordered]
+        scores.update(analise[0] for _, _, analise in ordered if analise is not None)
+        stats["signals"] = len(signals)
+        stats["merge_seconds"] = time.perf_counter() - started
+
+        if score:
+            started = time.perf_counter()
+            await loop.run_in_executor(None, _write_scores, scores_file, ordered)
+            stats["scores"] = dict(sorted(scores.items()))
+            stats["scores_file"] = scores_file
+            stats["scores_seconds"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        await loop.run_in_executor(_outbox_executor, self.outbox.record, signals, last_id or None)
+        stats["journal_seconds"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        try:
+            if self.worksheet is None:
+                await self.initialize_sheets()
+            await self.rewrite_recent(signals)
+            await loop.run_in_executor(_outbox_executor, self.outbox.ack_keys, [s.get_key() for s in signals])
+            invalidar_dados()
+            stats["flushed"] = True
+        except Exception as e:
+            # Os sinais continuam no journal; o caminho normal (com retentativas) assume
+            logger.error(f"[BACKFILL] Falha ao regravar a aba Auto: {e!r}; usando o outbox.")
+            stats["flushed"] = await self.flush_outbox()
+        stats["write_seconds"] = time.perf_counter() - started
+
+        def _rate(items, seconds):
+            return items / seconds if seconds > 0 else float("inf")
+
+        logger.info(f"[BACKFILL] Leitura: {stats['messages']} mensagens em {stats['fetch_seconds']:.2f}s "
+                    f"({_rate(stats['messages'], stats['fetch_seconds']):.0f} msg/s)")
+        logger.info(f"[BACKFILL] Parse/datas{'/score' if score else ''}: {stats['messages']} mensagens em "
+                    f"{stats['parse_cpu_seconds']:.2f}s de CPU nos workers "
+                    f"({_rate(stats['messages'], stats['parse_cpu_seconds']):.0f} msg/s por worker)")
+        logger.info(f"[BACKFILL] Leitura + pool: {stats['messages']} mensagens em {stats['pipeline_seconds']:.2f}s "
+                    f"({_rate(stats['messages'], stats['pipeline_seconds']):.0f} msg/s)")
+        logger.info(f"[BACKFILL] Deduplicação: {stats['signals']} sinais únicos em {stats['merge_seconds']:.3f}s")
+        if score:
+            logger.info(f"[BACKFILL] Scores por sinal gravados em {scores_file} em {stats['scores_seconds']:.2f}s")
+        logger.info(f"[BACKFILL] Journal: {stats['signals']} sinais em {stats['journal_seconds']:.2f}s "
+                    f"({_rate(stats['signals'], stats['journal_seconds']):.0f} sinais/s)")
+        logger.info(f"[BACKFILL] Planilha: {stats['signals']} sinais em {stats['write_seconds']:.2f}s "
+                    f"({_rate(stats['signals'], stats['write_seconds']):.0f} sinais/s)")
+        return stats
+
+    async def flush_outbox(self) -> bool:
+        """Drena o outbox para a planilha em lotes; retorna False se algo ficou pendente.
+
+        Com o Sheets fora do ar nada conta tentativa: os sinais só esperam a
+        próxima rodada, na ordem em que chegaram. Se a planilha responde e o
+        lote falha mesmo assim, ele é dividido ao meio até achar as entradas
+        que falham sozinhas; só essas contam tentativa (e são estacionadas).
+        """
+        loop = asyncio.get_running_loop()
+        wrote = False
+        complete = True
+        while True:
+            entries = await loop.run_in_executor(_outbox_executor, self.outbox.pending, self.outbox_batch_size)
+            if not entries:
+                break
+            try:
+                batch_ok = await self._flush_batch(entries)
+            except _SheetsIndisponivel as e:
+                logger.warning(f"[OUTBOX] Sheets indisponível ({e.__cause__!r}); {len(entries)} sinais aguardam "
+                               f"no journal para a próxima rodada.")
+                complete = False
+                break
+            wrote = True
+            if not batch_ok:
+                # Entradas que falharam sozinhas voltariam já no próximo pending(); ficam para a próxima rodada
+                complete = False
+                break
+
+        if wrote:
+            # A aba Auto mudou; a próxima análise relê a planilha
+            invalidar_dados()
+            try:
+                await self.clean_old_records()
+            except Exception as e:
+                logger.error(f"[OUTBOX] Falha na limpeza de registros antigos: {e!r}")
+        return complete
+
+    async def _flush_batch(self, entries) -> bool:
+        """Grava um lote com retentativas; retorna False se alguma entrada falhou sozinha."""
+        for attempt in range(1, self.sheets_retries + 1):
+            try:
+                await self._write_entries(entries)
+                break
+            except Exception as e:
+                error = e
+                logger.error(f"[OUTBOX] Falha ao gravar lote de {len(entries)} sinais "
+                             f"(tentativa {attempt}/{self.sheets_retries}): {e!r}")
+                if attempt < self.sheets_retries:
+                    await asyncio.sleep(self.retry_backoff * 2 ** (attempt - 1))
+        else:
+            if not await self._sheets_responde():
+                raise _SheetsIndisponivel() from error
+            return await self._isolate(entries, error)
+        await self._ack(entries)
+        return True
 
-        await self.clean_old_records()
+    async def _write_isolating(self, entries) -> bool:
+        try:
+            await self._write_entries(entries)
+        except Exception as e:
+            return await self._isolate(entries, e)
+        await self._ack(entries)
+        return True
+
+    async def _isolate(self, entries, error: Exception) -> bool:
+        """Divide um lote que falhou com a planilha respondendo; só a entrada que falha sozinha conta tentativa."""
+        if len(entries) > 1:
+            middle = len(entries) // 2
+            first = await self._write_isolating(entries[:middle])
+            second = await self._write_isolating(entries[middle:])
+            return first and second
+        # Confirma que o erro é da entrada e não do Sheets antes de contar a tentativa
+        if not await self._sheets_responde():
+            raise _SheetsIndisponivel() from error
+        entry_id, _, _, row = entries[0]
+        loop = asyncio.get_running_loop()
+        parked = await loop.run_in_executor(_outbox_executor, self.outbox.fail, [entry_id], repr(error))
+        logger.error(f"[OUTBOX] Sinal {row[0]} {row[1]} {row[2]} falhou sozinho: {error!r}")
+        if parked:
+            logger.error(f"[OUTBOX] Sinal {row[0]} {row[1]} atingiu {self.outbox.max_attempts} tentativas e foi "
+                         f"estacionado; nova tentativa em {self.outbox.park_seconds:.0f}s.")
+        return False
+
+    async def _write_entries(self, entries):
+        signals = [Signal(data=d, horario=h, ativo=a, direcao=dr, resultado=r, gale=g)
+                   for _, _, _, (d, h, a, dr, r, g) in entries]
+        if self.worksheet is None:
+            await self.initialize_sheets()
+        if any(failed_before for _, _, failed_before, _ in entries):
+            # Sinais posteriores já podem estar na aba: anexar no fim quebraria a ordem cronológica
+            await self.rewrite_recent(signals)
+        else:
+            # save_signals relê a planilha antes de anexar, então repetir um lote
+            # parcialmente gravado não duplica linhas
+            await self.save_signals(signals)
+
+    async def _ack(self, entries):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(_outbox_executor, self.outbox.ack, [(entry[0], entry[1]) for entry in entries])
+
+    async def _sheets_responde(self) -> bool:
+        if self.worksheet is None:
+            return False
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self.worksheet.get, "A1")
+            return True
+        except Exception:
+            return False
 
     async def save_signals(self, signals: List[Signal]):
 
@@ -138,17 +446,18 @@ class TelegramSignalCollector:
 
         loop = asyncio.get_running_loop()
         existing_with_index = await loop.run_in_executor(None, _load_existing_with_index)
+        existing_by_key = {}
+        for idx, row in existing_with_index:
+            existing_by_key.setdefault((row[0], row[1]), (idx, row))
 
         batch_to_append = []
         for signal in signals:
-            found = False
-            for idx, row in existing_with_index:
-                if row[0] == signal.data and row[1] == signal.horario:
-                    if row[4].upper() == "PENDENTE" and signal.resultado.upper() in ("WIN", "LOSS"):
-                        await loop.run_in_executor(None, _update_cell, idx, signal)
-                    found = True
-                    break
-            if not found:
+            existing = existing_by_key.get(signal.get_key())
+            if existing:
+                idx, row = existing
+                if row[4].upper() == "PENDENTE" and signal.resultado.upper() in ("WIN", "LOSS"):
+                    await loop.run_in_executor(None, _update_cell, idx, signal)
+            else:
                 batch_to_append.append(signal.to_list())
 
         if batch_to_append:
@@ -157,23 +466,122 @@ class TelegramSignalCollector:
                 await loop.run_in_executor(None, _append_batch, batch)
                 await asyncio.sleep(0.5)
         # gravando ultimo sinal no TXT
-        print("[COLETA] Gravando ultimo sinal no TXT")
+        logger.debug("[COLETA] Gravando ultimo sinal no TXT")
         registrar_ultimo_ativo(signal.data, signal.horario, signal.ativo)
         
 
+    def _replace_rows(self, values, rows_to_keep):
+        """Troca o conteúdo da aba por cabeçalho + `rows_to_keep` sem apagá-la antes.
+
+        Cabeçalho e linhas vão num único `update` a partir de A1; só depois as
+        linhas que sobraram da versão anterior são limpas. Se a escrita falhar,
+        a aba continua como estava.
+        """
+        header = values[:2] + [[] for _ in range(2 - len(values[:2]))]
+        # Linhas completas (A:G): células vazias também sobrescrevem o que havia antes
+        linhas = [list(row[:7]) + [""] * (7 - len(row[:7])) for row in header + rows_to_keep]
+        new_len = len(linhas)
+        self.worksheet.update(f"A1:G{new_len}", linhas)
+        if len(values) > new_len:
+            self.worksheet.batch_clear([f"A{new_len + 1}:G{len(values)}"])
+
+    async def rewrite_recent(self, signals: List[Signal]):
+        """Une os sinais à aba Auto e regrava as últimas `max_rows` linhas em ordem cronológica."""
+        def _rewrite():
+            values = self.worksheet.get_all_values()
+            rows = {}
+            for row in values[2:]:
+                if len(row) >= 5:
+                    rows.setdefault((row[0], row[1]), row[:7])
+            # Mesma regra do save_signals: linha existente só muda se estava PENDENTE
+            for signal in signals:
+                existing = rows.get(signal.get_key())
+                if existing is None or (existing[4].upper() == "PENDENTE" and signal.resultado.upper() in ("WIN", "LOSS")):
+                    rows[signal.get_key()] = signal.to_list()
+            rows_to_keep = sorted(rows.values(), key=lambda row: chronological_key(row[0], row[1]))[-self.max_rows:]
+            self._replace_rows(values, rows_to_keep)
+            logger.info(f"[COLETA] Aba regravada com {len(rows_to_keep)} linhas (de {len(rows)} sinais conhecidos).")
+            return rows_to_keep
+
+        loop = asyncio.get_running_loop()
+        rows_to_keep = await loop.run_in_executor(None, _rewrite)
+        if rows_to_keep:
+            ultimo = rows_to_keep[-1]
+            registrar_ultimo_ativo(ultimo[0], ultimo[1], ultimo[2])
+
     async def clean_old_records(self):
+        def _clean():
+            values = self.worksheet.get_all_values()
+            if len(values) > self.max_rows + 2:
+                rows_to_keep = [row[:7] for row in values[-self.max_rows:]]
+                self._replace_rows(values, rows_to_keep)
+                logger.info(f"[COLETA] Limpeza realizada. Total mantido (fora cabeçalho): {len(rows_to_keep)}")
+            else:
+                logger.info("[COLETA] Nenhuma limpeza necessária.")
+
         logger.info("[COLETA] Verificando necessidade de limpeza de registros antigos...")
-        values = self.worksheet.get_all_values()
-        if len(values) > 502:
-            header = values[:2]
-            rows_to_keep = values[-500:]
-            rows_to_keep = [row[:7] for row in rows_to_keep]
-            self.worksheet.clear()
-            self.worksheet.update("A1:G2", header)
-            self.worksheet.update(f"A3:G{2 + len(rows_to_keep)}", rows_to_keep)
-            logger.info(f"[COLETA] Limpeza realizada. Total mantido (fora cabeçalho): {len(rows_to_keep)}")
-        else:
-            logger.info("[COLETA] Nenhuma limpeza necessária.")
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, _clean)
+
+
+def _write_scores(path: str, ordered):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["data", "horario", "ativo", "direcao", "resultado", "gale", "score", "recomendacao"])
+        for _, signal, analise in ordered:
+            score, recomendacao = analise if analise is not None else ("", "")
+            writer.writerow(signal.to_list() + [score, recomendacao])
+
+
+class _SheetsIndisponivel(Exception):
+    """O lote falhou e a planilha nem responde a uma leitura: não é culpa das entradas."""
+
+
+_flush_event: Optional[asyncio.Event] = None
+
+
+def abrir_outbox() -> SheetsOutbox:
+    return shared_outbox(
+        os.getenv('OUTBOX_FILE', 'outbox_sheets.db'),
+        max_attempts=int(os.getenv('OUTBOX_MAX_ATTEMPTS', '10')),
+        park_seconds=float(os.getenv('OUTBOX_PARK_SECONDS', '600'))
+    )
+
+
+async def executar_flusher_outbox(telegram_client, intervalo: float = 30.0):
+    """Drena o outbox em segundo plano; acorda a cada coleta ou a cada `intervalo` segundos."""
+    global _flush_event
+    _flush_event = asyncio.Event()
+    collector = TelegramSignalCollector(500, telegram_client)
+    try:
+        while True:
+            await collector.flush_outbox()
+            try:
+                await asyncio.wait_for(_flush_event.wait(), intervalo)
+            except asyncio.TimeoutError:
+                pass
+            _flush_event.clear()
+    finally:
+        _flush_event = None
+
+
+async def aguardar_outbox_vazio(timeout: float = 60.0) -> bool:
+    """Espera o flusher esvaziar o outbox (ex.: antes de ler o último sinal da planilha).
+
+    Entradas estacionadas também contam: enquanto existirem, a última linha da
+    aba Auto pode não ser o último sinal.
+    """
+    outbox = abrir_outbox()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while pendentes := await loop.run_in_executor(_outbox_executor, outbox.count):
+        if loop.time() >= deadline:
+            parked = await loop.run_in_executor(_outbox_executor, outbox.parked_count)
+            logger.warning(f"[OUTBOX] Tempo esgotado aguardando gravação de {pendentes} sinais pendentes "
+                           f"({parked} estacionados).")
+            return False
+        await asyncio.sleep(0.5)
+    return True
 
 
 def registrar_ultimo_ativo(data, horario, ativo):
@@ -181,31 +589,37 @@ def registrar_ultimo_ativo(data, horario, ativo):
     linha_nova = f"{data} | {horario} | {ativo}"
 
     try:
-        # Lê o conteúdo atual
-        ultima_linha = ""
-        if os.path.exists(caminho_arquivo):
-            with open(caminho_arquivo, "r", encoding="utf-8") as f:
-                linhas = f.readlines()
-                if linhas:
-                    ultima_linha = linhas[-1].strip()
-
-        # Verifica se o último sinal já foi registrado
-        if ultima_linha == linha_nova:
-            print(f"[COLETA] Último ativo já registrado: {linha_nova}")
+        # Verifica se o último sinal já foi registrado (lê só o fim do arquivo)
+        if ultima_linha(caminho_arquivo) == linha_nova:
+            logger.debug(f"[COLETA] Último ativo já registrado: {linha_nova}")
             return
 
         # Acrescenta nova linha
         with open(caminho_arquivo, "a", encoding="utf-8") as f:
-            if os.path.getsize(caminho_arquivo) > 0:
+            if f.tell() > 0:
                 f.write("\n")  # Garante nova linha se o arquivo já tem conteúdo
             f.write(linha_nova)
+            tamanho = f.tell()
 
-        print(f"[COLETA] Último ativo registrado no arquivo: {linha_nova}")
+        if tamanho > int(os.getenv('ULTIMO_ATIVO_MAX_BYTES', str(64 * 1024))):
+            _compactar_ultimo_ativo(caminho_arquivo, int(os.getenv('ULTIMO_ATIVO_MANTER', '200')))
+
+        logger.info(f"[COLETA] Último ativo registrado no arquivo: {linha_nova}",
+                    extra={"campos": {"data": data, "horario": horario, "ativo": ativo}})
 
     except Exception as e:
-        print(f"[COLETA][ERRO] Falha ao registrar último ativo: {e}")
+        logger.error(f"[COLETA][ERRO] Falha ao registrar último ativo: {e}")
 
 
+def _compactar_ultimo_ativo(caminho_arquivo, manter):
+    # A primeira linha é a data do calendário lida por main_monitor; o resto são os últimos ativos
+    with open(caminho_arquivo, "r", encoding="utf-8") as f:
+        linhas = f.read().splitlines()
+    linhas = linhas[:1] + linhas[1:][-manter:]
+    tmp = f"{caminho_arquivo}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("\n".join(linhas))
+    os.replace(tmp, caminho_arquivo)
 
 
 async def enviar_ultimo_sinal_da_planilha():
@@ -220,6 +634,7 @@ async def enviar_ultimo_sinal_da_planilha():
         ]
         credentials = Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=scope)
         gc = gspread.authorize(credentials)
+        gc.set_timeout(float(os.getenv('SHEETS_TIMEOUT', '60')))
         sheet = gc.open(SHEET_NAME)
         worksheet = sheet.worksheet(WORKSHEET_NAME)
         linhas = worksheet.get_all_values()
@@ -233,7 +648,7 @@ async def enviar_ultimo_sinal_da_planilha():
     linha = await loop.run_in_executor(None, _carregar_ultimo_sinal)
 
     if not linha:
-        print("[COLETA][WARN] Não foi possível carregar o último sinal válido.")
+        logger.warning("[COLETA][WARN] Não foi possível carregar o último sinal válido.")
         return
 
     # Extrair ativo e horário
@@ -241,27 +656,36 @@ async def enviar_ultimo_sinal_da_planilha():
     ativo = linha[2].strip().upper()
     direcao = linha[3].strip().upper()
 
-    print(f"[COLETA] Último sinal lido:\n Ativo={ativo}, Horário={horario}")
+    logger.info(f"[COLETA] Último sinal lido: Ativo={ativo}, Horário={horario}")
 
     # Coletar dados e analisar
-    dados = coletar_dados()
-    resultados = analisar_sinal(ativo, horario, dados, direcao=direcao)
+    dados = coletar_dados_em_cache()
+    resultados = analisar_sinal_com_cache(ativo, horario, dados, direcao=direcao)
+    if not alertas_enviados.marcar(ativo, horario, direcao):
+        logger.info(f"[COLETA] Sinal {ativo} {horario} já alertado, alerta não reenviado")
+        return
 
 
     for r in resultados:
-        print(f"[COLETA] Enviando sinal para o telegram")
+        logger.info("[COLETA] Enviando sinal para o telegram",
+                    extra={"campos": {"ativo": r["ativo"], "horario": r["horario"], "score": r["score"]}})
         
-        enviar_telegram(
-            r["ativo"],
-            r["horario"],
-            r["winrate_horario"],
-            r["direcao"],
-            r["winrate_ativo"],
-            r["recomendacao"],
-            r["score"],
-            r["criterios"],
-            r["noticias_proximas"]
-        )
+        try:
+            enviar_telegram(
+                r["ativo"],
+                r["horario"],
+                r["winrate_horario"],
+                r["direcao"],
+                r["winrate_ativo"],
+                r["recomendacao"],
+                r["score"],
+                r["criterios"],
+                r["noticias_proximas"]
+            )
+        except Exception:
+            # Sem alerta enviado o sinal não conta como alertado; a próxima coleta tenta de novo
+            alertas_enviados.desmarcar(ativo, horario, direcao)
+            logger.exception(f"[COLETA] Falha ao enviar alerta de {ativo} {horario}; sinal liberado para nova tentativa")
 
 
 async def executar_automacao(telegram_client):
@@ -0,0 +1,33 @@
+import argparse
+import asyncio
+import os
+from telethon import TelegramClient
+from automacao_v3 import TelegramSignalCollector
+from log_estruturado import configurar_logging
+
+TELEGRAM_API_ID = int(os.getenv("TELEGRAM_API_ID", "29194173"))
+TELEGRAM_API_HASH = os.getenv("TELEGRAM_API_HASH", "aa6eac958b72727ff8802895a106a74c")
+SESSION_NAME = "backfill_session"
+
+async def main(args):
+    client = TelegramClient(SESSION_NAME, TELEGRAM_API_ID, TELEGRAM_API_HASH)
+    await client.start()
+    try:
+        collector = TelegramSignalCollector(args.mensagens // 2, client)
+        stats = await collector.backfill(args.mensagens, workers=args.workers, chunk_size=args.lote,
+                                         score=args.score, scores_file=args.saida_scores)
+        print(f"[BACKFILL] Concluído: {stats['signals']} sinais únicos de {stats['messages']} mensagens.")
+        if "scores" in stats:
+            print(f"[BACKFILL] Distribuição de score: {stats['scores']} (por sinal em {stats['scores_file']})")
+    finally:
+        await client.disconnect()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reprocessa o histórico do grupo e regrava a aba Auto")
+    parser.add_argument("--mensagens", type=int, default=20000, help="quantidade de mensagens do histórico a ler")
+    parser.add_argument("--workers", type=int, default=None, help="processos para parse/score (padrão: núcleos da CPU)")
+    parser.add_argument("--lote", type=int, default=1000, help="mensagens por lote enviado ao pool")
+    parser.add_argument("--score", action="store_true", help="calcula o score de cada sinal com os dados da planilha")
+    parser.add_argument("--saida-scores", default="backfill_scores.csv", help="CSV com score e recomendação de cada sinal")
+    configurar_logging()
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,176 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import statistics
+import tempfile
+import time
+from unittest import mock
+
+import analisador
+import automacao_v3
+import calendário as calendario
+import main_monitor
+from simulacao import (
+    GRUPO_ID,
+    FakeHttp,
+    FakeTelegramClient,
+    ambiente_simulado,
+    gerar_aberturas,
+    gerar_historico,
+    planilha_trade_fake,
+)
+
+
+def _resumo(latencias):
+    ordenadas = sorted(latencias)
+    p95 = ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * 0.95))]
+    return (f"média {statistics.mean(ordenadas) * 1000:.2f} ms | p50 {statistics.median(ordenadas) * 1000:.2f} ms | "
+            f"p95 {p95 * 1000:.2f} ms | máx {ordenadas[-1] * 1000:.2f} ms")
+
+
+def _relatorio(etapa, itens, unidade, duracao, latencias, observacao=None):
+    taxa = itens / duracao if duracao > 0 else float("inf")
+    print(f"[BENCHMARK] {etapa}: {itens} {unidade} em {duracao:.3f}s -> {taxa:.1f} {unidade}/s")
+    if latencias:
+        print(f"[BENCHMARK] {etapa}: latência {_resumo(latencias)}")
+    if observacao:
+        print(f"[BENCHMARK] {etapa}: {observacao}")
+
+
+def bench_calendario(args):
+    latencias = []
+    eventos = 0
+    with ambiente_simulado(planilha_trade_fake(args.latencia_sheets), FakeHttp(latencia=args.latencia_http)):
+        for _ in range(args.repeticoes):
+            inicio = time.perf_counter()
+            eventos = len(calendario.coletar_eventos())
+            calendario.main()
+            latencias.append(time.perf_counter() - inicio)
+    return "calendário", eventos * args.repeticoes, "eventos", sum(latencias), latencias
+
+
+def bench_analisador(args):
+    aberturas = gerar_aberturas(args.sinais)
+    latencias = []
+    with ambiente_simulado(planilha_trade_fake(args.latencia_sheets)):
+        inicio_total = time.perf_counter()
+        dados = analisador.coletar_dados()
+        for mensagem in aberturas:
+            linhas = mensagem.message.splitlines()
+            ativo = linhas[1].split(":", 1)[1].strip()
+            horario = linhas[2].split(":", 1)[1].strip()
+            inicio = time.perf_counter()
+            analisador.analisar_sinal(ativo, horario, dados)
+            latencias.append(time.perf_counter() - inicio)
+        duracao = time.perf_counter() - inicio_total
+    return "analisador", len(aberturas), "sinais", duracao, latencias
+
+
+def bench_automacao(args):
+    cliente = FakeTelegramClient(gerar_historico(args.historico))
+    planilha = planilha_trade_fake(args.latencia_sheets)
+    with ambiente_simulado(planilha):
+        collector = automacao_v3.TelegramSignalCollector(args.historico // 2, cliente)
+        registrar = collector.outbox.record
+        coletados = []
+
+        def _registrar(signals, last_message_id=None):
+            coletados.extend(signals)
+            return registrar(signals, last_message_id)
+
+        collector.outbox.record = _registrar
+        inicio = time.perf_counter()
+        asyncio.run(collector.collect_and_save())
+        duracao = time.perf_counter() - inicio
+    salvos = len(coletados)
+    # A coleta grava em lote; não há latência individual por sinal para medir aqui
+    return "automacao_v3", salvos, "sinais", duracao, [], "coleta e gravação em lote, só vazão"
+
+
+def bench_backfill(args):
+    historico = gerar_historico(args.historico)
+    cliente = FakeTelegramClient(historico)
+    planilha = planilha_trade_fake(args.latencia_sheets)
+    with ambiente_simulado(planilha):
+        collector = automacao_v3.TelegramSignalCollector(args.historico // 2, cliente)
+        inicio = time.perf_counter()
+        stats = asyncio.run(collector.backfill(args.historico, workers=args.workers, chunk_size=args.lote, score=True))
+        duracao = time.perf_counter() - inicio
+        linhas = planilha.worksheet("Auto").get_all_values()[2:]
+    # O sinal mais novo do histórico tem que sobreviver à regravação da aba
+    mais_novo = automacao_v3.parse_signal_text(historico[0].message)
+    automacao_v3.adjust_signal_date(mais_novo, historico[0].date.astimezone(collector.timezone))
+    if not linhas or (linhas[-1][0], linhas[-1][1]) != mais_novo.get_key():
+        raise RuntimeError(f"Backfill perdeu o sinal mais novo {mais_novo.get_key()}; "
+                           f"última linha da Auto: {linhas[-1][:2] if linhas else None}")
+    observacao = (f"{stats['workers']} workers | leitura {stats['fetch_seconds']:.3f}s | "
+                  f"parse/score {stats['parse_cpu_seconds']:.3f}s CPU | leitura+pool {stats['pipeline_seconds']:.3f}s | "
+                  f"journal {stats['journal_seconds']:.3f}s | planilha {stats['write_seconds']:.3f}s")
+    return "backfill", stats["messages"], "mensagens", duracao, [], observacao
+
+
+def bench_main_monitor(args):
+    # Intercala mensagens de outro chat: o handler registrado com chats=GROUP_ID deve ignorá-las
+    do_grupo = gerar_aberturas(args.sinais)
+    de_outro_chat = gerar_aberturas(args.sinais, chat_id=GRUPO_ID - 1)
+    eventos = [m for par in zip(do_grupo, de_outro_chat) for m in par]
+    cliente = FakeTelegramClient(gerar_historico(args.historico), eventos)
+    http = FakeHttp(latencia=args.latencia_http)
+    analisador.cache_analises.limpar()
+    analisador.alertas_enviados.limpar()
+    analisador.invalidar_dados()
+    with ambiente_simulado(planilha_trade_fake(args.latencia_sheets), http), \
+            mock.patch.object(main_monitor, "TelegramClient", lambda *a, **k: cliente):
+        inicio = time.perf_counter()
+        asyncio.run(main_monitor.main_loop())
+        duracao = time.perf_counter() - inicio
+    if len(cliente.latencias) != len(do_grupo) or cliente.ignorados != len(de_outro_chat):
+        raise RuntimeError(f"Filtro de chats do handler falhou: {len(cliente.latencias)} tratadas, "
+                           f"{cliente.ignorados} ignoradas (esperado {len(do_grupo)}/{len(de_outro_chat)})")
+    observacao = (f"{len(http.mensagens_enviadas)} alertas enviados à Bot API simulada, {cliente.ignorados} mensagens "
+                  f"de outro chat ignoradas, total {duracao:.3f}s com coleta inicial")
+    return "main_monitor", len(cliente.latencias), "sinais", sum(cliente.latencias), cliente.latencias, observacao
+
+
+ETAPAS = {
+    "calendario": bench_calendario,
+    "analisador": bench_analisador,
+    "automacao": bench_automacao,
+    "backfill": bench_backfill,
+    "monitor": bench_main_monitor,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ponta a ponta com Sheets, Telegram e investing.com simulados")
+    parser.add_argument("--sinais", type=int, default=200, help="mensagens de abertura de sinal disparadas no monitor/analisador")
+    parser.add_argument("--historico", type=int, default=1000, help="mensagens no histórico do grupo para a coleta")
+    parser.add_argument("--repeticoes", type=int, default=5, help="execuções do calendário")
+    parser.add_argument("--latencia-sheets", type=float, default=0.0, help="latência simulada por chamada ao Sheets (ms)")
+    parser.add_argument("--latencia-http", type=float, default=0.0, help="latência simulada por requisição HTTP (ms)")
+    parser.add_argument("--workers", type=int, default=None, help="processos usados na etapa de backfill")
+    parser.add_argument("--lote", type=int, default=1000, help="mensagens por lote no backfill")
+    parser.add_argument("--etapas", nargs="+", choices=list(ETAPAS), default=list(ETAPAS))
+    parser.add_argument("--verbose", action="store_true", help="mostra a saída dos módulos durante o benchmark")
+    args = parser.parse_args()
+    args.latencia_sheets /= 1000
+    args.latencia_http /= 1000
+
+    # Arquivos como ultima_execucao.txt e o outbox são gravados em um diretório temporário por etapa
+    diretorio_original = os.getcwd()
+    for nome in args.etapas:
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                saida = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+                with saida:
+                    resultado = ETAPAS[nome](args)
+            finally:
+                os.chdir(diretorio_original)
+        _relatorio(*resultado)
+
+
+if __name__ == "__main__":
+    main()
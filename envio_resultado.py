@@ -8,6 +8,7 @@ def enviar_telegram(ativo, horario,winrate_horario,direcao,winrate_ativo, recome
         direcao = "PUT 🔻"
     else:
         direcao = "CALL 🟢 "
+    separador = "\n- "
     mensagem = f"""📈 NOVO SINAL ANALISADO
 
 Ativo: {ativo} Winrate {winrate_ativo}%
@@ -17,10 +18,10 @@ Recomendação: {recomendacao}
 Score: {score}
 
 Critérios:
-{'\n- '.join(criterios)}
+{separador.join(criterios)}
 
 Notícias:
-{'\n- '.join(noticias_proximas)}
+{separador.join(noticias_proximas)}
 """
     url = f"https://api.telegram.org/bot{TOKEN}/sendMessage"
     requests.post(url, data={"chat_id": CHAT_ID, "text": mensagem})
\ No newline at end of file
@@ -0,0 +1,130 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+from datetime import datetime, timezone
+
+# Logging estruturado: os módulos só enfileiram registros; um QueueListener em
+# outra thread grava JSON lines num arquivo rotacionado e texto no console.
+
+_listener = None
+FORMATO_CONSOLE = "%(asctime)s - %(levelname)s - %(message)s"
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Como o QueueHandler, mas mantém a mensagem e o traceback separados (exc_text) para o JSON."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        evento = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "origem": record.name,
+            "msg": record.getMessage(),
+        }
+        # Campos extras ficam aninhados para não sobrescrever ts/nivel/origem/msg
+        campos = getattr(record, "campos", None)
+        if campos:
+            evento["campos"] = campos
+        if record.exc_info:
+            evento["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            evento["exc"] = record.exc_text
+        return json.dumps(evento, ensure_ascii=False, default=str)
+
+
+def _nivel(valor):
+    """Aceita 'debug', 'INFO', '10' ou logging.DEBUG; retorna None se o valor não for um nível."""
+    if isinstance(valor, int):
+        return valor
+    texto = str(valor).strip().upper()
+    if texto.isdigit():
+        return int(texto)
+    nivel = logging.getLevelName(texto)
+    return nivel if isinstance(nivel, int) else None
+
+
+def configurar_logging(arquivo=None, nivel=None, max_bytes=None, backups=None):
+    """Instala o QueueHandler na raiz e inicia o listener (arquivo JSON + console). Idempotente."""
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    arquivo = arquivo or os.getenv("LOG_FILE", "monitor_eventos.log")
+    nivel_informado = nivel or os.getenv("LOG_LEVEL", "INFO")
+    nivel = _nivel(nivel_informado)
+    max_bytes = max_bytes or int(os.getenv("LOG_MAX_BYTES", str(5 * 1024 * 1024)))
+    backups = backups or int(os.getenv("LOG_BACKUPS", "5"))
+
+    arquivo_handler = logging.handlers.RotatingFileHandler(arquivo, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+    arquivo_handler.setFormatter(JsonFormatter())
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter(FORMATO_CONSOLE))
+
+    fila = queue.SimpleQueue()
+    raiz = logging.getLogger()
+    for handler in list(raiz.handlers):
+        raiz.removeHandler(handler)
+    raiz.addHandler(_QueueHandler(fila))
+    raiz.setLevel(nivel if nivel is not None else logging.INFO)
+
+    _listener = logging.handlers.QueueListener(fila, arquivo_handler, console_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(encerrar_logging)
+    if nivel is None:
+        logging.getLogger(__name__).warning("LOG_LEVEL inválido %r; usando INFO", nivel_informado)
+    return _listener
+
+
+def configurar_logging_worker(nivel=logging.INFO):
+    """Para processos filhos: troca o QueueHandler herdado (ninguém drena a fila no filho) por stderr."""
+    raiz = logging.getLogger()
+    for handler in list(raiz.handlers):
+        raiz.removeHandler(handler)
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(f"%(processName)s - {FORMATO_CONSOLE}"))
+    raiz.addHandler(handler)
+    raiz.setLevel(nivel)
+
+
+def encerrar_logging():
+    """Esvazia a fila e fecha os arquivos."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def ultima_linha(caminho, bloco=4096) -> str:
+    """Lê a última linha não vazia do arquivo buscando a partir do fim, sem carregar o arquivo inteiro."""
+    try:
+        with open(caminho, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            posicao = f.tell()
+            dados = b""
+            while posicao > 0:
+                leitura = min(bloco, posicao)
+                posicao -= leitura
+                f.seek(posicao)
+                dados = f.read(leitura) + dados
+                linhas = dados.rstrip(b"\r\n").split(b"\n")
+                if len(linhas) > 1 or posicao == 0:
+                    return linhas[-1].decode("utf-8", errors="replace").strip()
+    except FileNotFoundError:
+        pass
+    return ""
@@ -1,83 +1,108 @@
 import asyncio
+import logging
 import os
 from telethon import TelegramClient, events
-from automacao_v3 import executar_automacao, TelegramSignalCollector, enviar_ultimo_sinal_da_planilha
-from analisador import analisar_sinal,coletar_dados
+from automacao_v3 import executar_automacao, parse_signal_text, enviar_ultimo_sinal_da_planilha, executar_flusher_outbox, aguardar_outbox_vazio
+from analisador import analisar_sinal_com_cache, coletar_dados_em_cache, invalidar_dados, alertas_enviados
 from envio_resultado import enviar_telegram
 from calendário import main as executar_calendario  # IMPORTA O MAIN DO CALENDÁRIO
+from log_estruturado import configurar_logging
 
 TELEGRAM_API_ID = int(os.getenv("TELEGRAM_API_ID", "29194173"))
 TELEGRAM_API_HASH = os.getenv("TELEGRAM_API_HASH", "aa6eac958b72727ff8802895a106a74c")
 SESSION_NAME = "monitor_session"
 GROUP_ID = int(os.getenv('TELEGRAM_GROUP_ID', '-1001673441581'))
+logger = logging.getLogger(__name__)
 
 async def main_loop():
     client = TelegramClient(SESSION_NAME, TELEGRAM_API_ID, TELEGRAM_API_HASH)
     await client.start()
-    print("[INFO] Cliente Telegram iniciado.")
+    logger.info("Cliente Telegram iniciado.")
 
     # Executa calendário no início
     await asyncio.to_thread(verificar_e_executar_calendario)
 
     # Executa automação no início
-    print("[INFO] Gravando ultimos sinais na aba auto")
+    logger.info("Gravando ultimos sinais na aba auto")
     await executar_automacao(client)
-    print("[INFO] Monitorando novas mensagens")
+    # A partir daqui as gravações no Sheets saem do outbox em segundo plano
+    flusher = asyncio.create_task(executar_flusher_outbox(client))
+    flusher.add_done_callback(_reportar_fim_flusher)
+    logger.info("Monitorando novas mensagens")
 
     @client.on(events.NewMessage(chats=GROUP_ID))
     async def handler(event):
         mensagem = event.raw_text
         if "direção" in mensagem.lower():
-            print(f"[INFO] Mensagem com 'direção' detectada: {mensagem}")
+            logger.info("Mensagem com 'direção' detectada")
+            logger.debug("Texto da mensagem: %s", mensagem)
 
-            collector = TelegramSignalCollector(500, client)
-            sinal_obj = collector.parse_signal(mensagem)
+            sinal_obj = parse_signal_text(mensagem)
 
             if sinal_obj:
                 ativo = sinal_obj.ativo
                 horario = sinal_obj.horario
 
                 # Carregar os dados coletados reais do calendário (ou planilha)
-                dados_coletados = coletar_dados()
+                dados_coletados = coletar_dados_em_cache()
                 if dados_coletados:  
-                    print("[INFO] Informações de ativos e horarios coletados da planilha")
-                    sinais = analisar_sinal(ativo, horario, dados_coletados)
+                    logger.info("Informações de ativos e horarios coletados da planilha")
+                    sinais = analisar_sinal_com_cache(ativo, horario, dados_coletados, direcao=sinal_obj.direcao)
+                    if not alertas_enviados.marcar(ativo, horario, sinal_obj.direcao):
+                        logger.info("Sinal %s %s já alertado, alerta não reenviado", ativo, horario)
+                        sinais = []
                     for r in sinais:
-                        print(f"[INFO] Enviando sinal - NOVO para o telegram")
-                        enviar_telegram(
-                            r["ativo"],
-                            r["horario"],
-                            r["winrate_horario"],
-                            r["direcao"],
-                            r["winrate_ativo"],
-                            r["recomendacao"],
-                            r["score"],
-                            r["criterios"],
-                            r["noticias_proximas"]
-                        )
+                        logger.info("Enviando sinal - NOVO para o telegram")
+                        try:
+                            enviar_telegram(
+                                r["ativo"],
+                                r["horario"],
+                                r["winrate_horario"],
+                                r["direcao"],
+                                r["winrate_ativo"],
+                                r["recomendacao"],
+                                r["score"],
+                                r["criterios"],
+                                r["noticias_proximas"]
+                            )
+                        except Exception:
+                            # O alerta não saiu: a análise do último sinal em 6 min ainda pode enviá-lo
+                            alertas_enviados.desmarcar(ativo, horario, sinal_obj.direcao)
+                            logger.exception("Falha ao enviar alerta de %s %s; sinal liberado para nova tentativa", ativo, horario)
 
                     # Agenda nova automação em 6 min
                     asyncio.create_task(agendar_automacao_em_6_min(client))
                 else:
-                    print("[WARN] Não foi possível extrair o sinal da mensagem.")
+                    logger.warning("Não foi possível extrair o sinal da mensagem.")
             else:
-                print(f"[INFO] Mensagem ignorada: {mensagem}")
+                logger.debug("Mensagem ignorada: %s", mensagem)
 
     await client.run_until_disconnected()
 
+def _reportar_fim_flusher(task):
+    if task.cancelled():
+        return
+    erro = task.exception()
+    if erro is not None:
+        logger.error("Flusher do outbox parou; sinais ficam no journal até reiniciar", exc_info=erro)
+
+
 async def agendar_automacao_em_6_min(client):
-    print("[INFO] Coleta de sinais agendada para rodar em 6 minutos...")
+    logger.info("Coleta de sinais agendada para rodar em 6 minutos...")
     await asyncio.sleep(360)
-    print("[INFO] Verificando calendário pós sinal")
+    logger.info("Verificando calendário pós sinal")
     await asyncio.to_thread(verificar_e_executar_calendario)
 
     # Executa automação no início
-    print("[INFO] Gravando ultimos sinais na aba auto...")
+    logger.info("Gravando ultimos sinais na aba auto...")
     await executar_automacao(client)
-    print("[INFO] Analisando ultimo sinal gravado...")
-    await enviar_ultimo_sinal_da_planilha()
-    print("[INFO] Coleta de sinais executada!")
-    print("[INFO] Monitorando novas mensagens...")
+    if await aguardar_outbox_vazio():
+        logger.info("Analisando ultimo sinal gravado...")
+        await enviar_ultimo_sinal_da_planilha()
+    else:
+        logger.warning("Sinais ainda no outbox; a última linha da aba auto pode não ser o último sinal, análise pulada")
+    logger.info("Coleta de sinais executada!")
+    logger.info("Monitorando novas mensagens...")
     
 
 
@@ -93,20 +118,21 @@ def verificar_e_executar_calendario():
             data_ultima_execucao = f.readline().strip()
 
     if data_ultima_execucao == hoje:
-        print(f"[INFO] Calendário já atualizado hoje ({hoje}). Nenhuma ação necessária.")
+        logger.info("Calendário já atualizado hoje (%s). Nenhuma ação necessária.", hoje)
         return
     else:
-        print(f"Data da ultima ex `{data_ultima_execucao} e \n hoje: {hoje}")
-        print(f"[INFO] Executando calendário (última execução: {data_ultima_execucao})...")
+        logger.info("Executando calendário (última execução: %s)...", data_ultima_execucao)
         executar_calendario()  # chama a função real do calendário
+        invalidar_dados()
 
         # Atualiza o arquivo com a data atual
         with open(caminho_arquivo, "w") as f:
             f.write(hoje)
-        print(f"[INFO] Data da última execução atualizada para {hoje}.")
+        logger.info("Data da última execução atualizada para %s.", hoje)
 
 
 def start_monitor():
+    configurar_logging()
     asyncio.run(main_loop())
 
 if __name__ == "__main__":
@@ -0,0 +1,141 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+
+class SheetsOutbox:
+    """Journal SQLite dos sinais que ainda precisam ser gravados na aba Auto.
+
+    Cada sinal é gravado aqui antes de qualquer chamada ao Sheets; o flusher
+    remove a entrada só depois que a escrita na planilha deu certo. Sinais
+    repetidos (mesma data e horário) são unificados numa única entrada.
+    Tentativas contam por entrada (o flusher só chama `fail` para a entrada
+    que falhou sozinha); as que falham `max_attempts` vezes ficam
+    estacionadas e só voltam a ser tentadas a cada `park_seconds`, para não
+    travar a fila.
+    """
+
+    def __init__(self, path: str, max_attempts: int = 10, park_seconds: float = 600.0):
+        self.path = Path(path)
+        self.max_attempts = max_attempts
+        self.park_seconds = park_seconds
+        self._lock = threading.Lock()
+        # Uma conexão só, usada sob o lock a partir de qualquer thread
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS pendentes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    data TEXT NOT NULL,
+                    horario TEXT NOT NULL,
+                    ativo TEXT NOT NULL,
+                    direcao TEXT NOT NULL,
+                    resultado TEXT NOT NULL,
+                    gale INTEGER NOT NULL,
+                    versao INTEGER NOT NULL DEFAULT 1,
+                    tentativas INTEGER NOT NULL DEFAULT 0,
+                    ultima_tentativa REAL NOT NULL DEFAULT 0,
+                    ultimo_erro TEXT,
+                    criado_em REAL NOT NULL,
+                    UNIQUE (data, horario)
+                )
+            """)
+            self._conn.execute("CREATE TABLE IF NOT EXISTS estado (chave TEXT PRIMARY KEY, valor TEXT)")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def record(self, signals, last_message_id: Optional[int] = None) -> int:
+        """Grava os sinais (e o checkpoint da última mensagem lida) numa única transação."""
+        linhas = [(s.data, s.horario, s.ativo, s.direcao, s.resultado, s.gale, time.time()) for s in signals]
+        with self._lock, self._conn:
+            self._conn.executemany("""
+                INSERT INTO pendentes (data, horario, ativo, direcao, resultado, gale, criado_em)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (data, horario) DO UPDATE SET
+                    ativo = excluded.ativo,
+                    direcao = excluded.direcao,
+                    resultado = excluded.resultado,
+                    gale = excluded.gale,
+                    versao = pendentes.versao + 1,
+                    tentativas = 0
+            """, linhas)
+            if last_message_id is not None:
+                self._conn.execute("""
+                    INSERT INTO estado (chave, valor) VALUES ('last_message_id', ?)
+                    ON CONFLICT (chave) DO UPDATE SET valor = MAX(CAST(estado.valor AS INTEGER), CAST(excluded.valor AS INTEGER))
+                """, (str(last_message_id),))
+        return len(linhas)
+
+    def pending(self, limit: int) -> List[Tuple[int, int, bool, tuple]]:
+        """Retorna até `limit` entradas como (id, versao, ja_falhou, (data, horario, ativo, direcao, resultado, gale)).
+
+        Entradas ativas vêm primeiro; as estacionadas só entram depois de `park_seconds` da última falha.
+        `ja_falhou` indica que a entrada já falhou sozinha e sinais posteriores podem ter sido gravados antes dela.
+        """
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT id, versao, ultima_tentativa > 0, data, horario, ativo, direcao, resultado, gale
+                FROM pendentes
+                WHERE tentativas < ? OR ultima_tentativa < ?
+                ORDER BY tentativas >= ?, id LIMIT ?
+            """, (self.max_attempts, time.time() - self.park_seconds, self.max_attempts, limit)).fetchall()
+        return [(row[0], row[1], bool(row[2]), tuple(row[3:])) for row in rows]
+
+    def ack(self, entries: List[Tuple[int, int]]):
+        """Remove as entradas gravadas; se alguma foi atualizada no meio do flush, ela fica para a próxima rodada."""
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM pendentes WHERE id = ? AND versao = ?", entries)
+
+    def ack_keys(self, keys: List[Tuple[str, str]]):
+        """Remove entradas por (data, horario), para quem gravou a planilha sem passar por pending()."""
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM pendentes WHERE data = ? AND horario = ?", keys)
+
+    def fail(self, ids: List[int], error: str) -> int:
+        """Conta uma falha para cada entrada; retorna quantas passaram a ficar estacionadas."""
+        if not ids:
+            return 0
+        agora = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE pendentes SET tentativas = tentativas + 1, ultima_tentativa = ?, ultimo_erro = ? WHERE id = ?",
+                [(agora, error, i) for i in ids]
+            )
+            marcadores = ",".join("?" * len(ids))
+            return self._conn.execute(
+                f"SELECT COUNT(*) FROM pendentes WHERE tentativas = ? AND id IN ({marcadores})",
+                (self.max_attempts, *ids)
+            ).fetchone()[0]
+
+    def count(self) -> int:
+        """Entradas ainda não gravadas na planilha, inclusive as estacionadas."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pendentes").fetchone()[0]
+
+    def parked_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pendentes WHERE tentativas >= ?", (self.max_attempts,)).fetchone()[0]
+
+    def last_message_id(self) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT valor FROM estado WHERE chave = 'last_message_id'").fetchone()
+        return int(row[0]) if row else 0
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def shared_outbox(path: str, **kwargs) -> SheetsOutbox:
+    """Uma instância (e uma conexão) por arquivo no processo inteiro."""
+    chave = Path(path).resolve()
+    with _shared_lock:
+        if chave not in _shared:
+            _shared[chave] = SheetsOutbox(str(chave), **kwargs)
+        return _shared[chave]
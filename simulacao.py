@@ -0,0 +1,332 @@
+import asyncio
+import os
+import re
+import time
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import mock
+
+import gspread
+import pytz
+import requests
+from google.oauth2.service_account import Credentials
+
+# Substitutos locais para Google Sheets, Telethon, Bot API e investing.com,
+# usados pelo benchmark.py para rodar o fluxo completo sem rede.
+
+FIXTURE_CALENDARIO = Path(__file__).parent / "fixtures" / "calendario.html"
+GRUPO_ID = int(os.getenv('TELEGRAM_GROUP_ID', '-1001673441581'))
+
+ATIVOS = [
+    "EURUSD-OTC", "GBPUSD-OTC", "AUDCAD-OTC", "EURGBP-OTC", "USDJPY-OTC",
+    "AUS200-OTC", "USDCHF-OTC", "NZDUSD-OTC", "EURJPY-OTC", "GBPJPY-OTC",
+    "AUDUSD-OTC", "USDCAD-OTC", "EURAUD-OTC", "GBPAUD-OTC"
+]
+
+
+def _coluna_para_indice(letras: str) -> int:
+    indice = 0
+    for c in letras.upper():
+        indice = indice * 26 + (ord(c) - ord("A") + 1)
+    return indice - 1
+
+
+def _parse_a1(intervalo: str):
+    # "A3:G10" -> (linha_ini, col_ini, linha_fim, col_fim), base 0 e inclusivo
+    partes = intervalo.split("!")[-1].split(":")
+    coords = []
+    for parte in partes:
+        m = re.fullmatch(r"([A-Za-z]+)(\d+)", parte.strip())
+        if not m:
+            raise ValueError(f"Intervalo A1 inválido: {intervalo}")
+        coords.append((int(m.group(2)) - 1, _coluna_para_indice(m.group(1))))
+    if len(coords) == 1:
+        coords.append(coords[0])
+    (l1, c1), (l2, c2) = coords
+    return l1, c1, l2, c2
+
+
+class FakeWorksheet:
+    """Worksheet em memória com a mesma API usada do gspread e latência simulada."""
+
+    def __init__(self, title: str, linhas=None, latencia: float = 0.0, row_count: int = 1000):
+        self.title = title
+        self.latencia = latencia
+        self.row_count = row_count
+        self.timeout = None
+        self.chamadas = {"get": 0, "get_all_values": 0, "update": 0, "col_values": 0, "clear": 0, "batch_clear": 0}
+        self._celulas = {}
+        for i, linha in enumerate(linhas or []):
+            for j, valor in enumerate(linha):
+                if valor != "":
+                    self._celulas[(i, j)] = str(valor)
+
+    def _aguardar(self, operacao: str):
+        self.chamadas[operacao] += 1
+        if self.timeout is not None and self.latencia > self.timeout:
+            # Como o timeout do cliente HTTP: a chamada falha e nada é aplicado
+            time.sleep(self.timeout)
+            raise requests.exceptions.ReadTimeout(f"{operacao} excedeu {self.timeout}s")
+        if self.latencia:
+            time.sleep(self.latencia)
+
+    def _dimensoes(self):
+        if not self._celulas:
+            return 0, 0
+        return max(l for l, _ in self._celulas) + 1, max(c for _, c in self._celulas) + 1
+
+    def _ler(self, l1, c1, l2, c2):
+        linhas = []
+        for i in range(l1, l2 + 1):
+            linha = [self._celulas.get((i, j), "") for j in range(c1, c2 + 1)]
+            while linha and linha[-1] == "":
+                linha.pop()
+            linhas.append(linha)
+        while linhas and not linhas[-1]:
+            linhas.pop()
+        return linhas
+
+    def get(self, intervalo: str):
+        self._aguardar("get")
+        return self._ler(*_parse_a1(intervalo))
+
+    def get_all_values(self):
+        self._aguardar("get_all_values")
+        total_linhas, total_colunas = self._dimensoes()
+        return [[self._celulas.get((i, j), "") for j in range(total_colunas)] for i in range(total_linhas)]
+
+    def update(self, intervalo: str, valores, value_input_option=None):
+        self._aguardar("update")
+        l1, c1, _, _ = _parse_a1(intervalo)
+        for i, linha in enumerate(valores):
+            for j, valor in enumerate(linha):
+                chave = (l1 + i, c1 + j)
+                if valor == "" or valor is None:
+                    self._celulas.pop(chave, None)
+                else:
+                    self._celulas[chave] = str(valor)
+        return {"updatedRange": intervalo}
+
+    def col_values(self, coluna: int):
+        self._aguardar("col_values")
+        total_linhas, _ = self._dimensoes()
+        valores = [self._celulas.get((i, coluna - 1), "") for i in range(total_linhas)]
+        while valores and valores[-1] == "":
+            valores.pop()
+        return valores
+
+    def clear(self):
+        self._aguardar("clear")
+        self._celulas.clear()
+
+    def batch_clear(self, intervalos):
+        self._aguardar("batch_clear")
+        for intervalo in intervalos:
+            l1, c1, l2, c2 = _parse_a1(intervalo)
+            for chave in [k for k in self._celulas if l1 <= k[0] <= l2 and c1 <= k[1] <= c2]:
+                del self._celulas[chave]
+
+
+class FakeSpreadsheet:
+    def __init__(self, title: str, worksheets: dict):
+        self.title = title
+        self.worksheets = worksheets
+
+    def worksheet(self, nome: str) -> FakeWorksheet:
+        if nome not in self.worksheets:
+            raise gspread.exceptions.WorksheetNotFound(nome)
+        return self.worksheets[nome]
+
+
+class FakeGspreadClient:
+    def __init__(self, planilhas: dict):
+        self.planilhas = planilhas
+
+    def set_timeout(self, timeout=None):
+        for planilha in self.planilhas.values():
+            for worksheet in planilha.worksheets.values():
+                worksheet.timeout = timeout
+
+    def open(self, nome: str) -> FakeSpreadsheet:
+        if nome not in self.planilhas:
+            raise gspread.exceptions.SpreadsheetNotFound(nome)
+        return self.planilhas[nome]
+
+
+def planilha_trade_fake(latencia: float = 0.0) -> FakeSpreadsheet:
+    """Monta a planilha 'Trade' com as abas ANALISES, NOTICIAS e Auto preenchidas."""
+    analises = [[""] * 15 for _ in range(26)]
+    analises[0][0], analises[0][1] = "Horário", "Winrate"
+    for h in range(24):
+        analises[1 + h][0] = f"{h:02d}:00"
+        analises[1 + h][1] = f"{70 + (h * 7) % 30},0%"
+    for i, ativo in enumerate(ATIVOS):
+        analises[2 + i][9] = ativo
+        analises[2 + i][10] = f"{60 + (i * 5) % 35},5%"
+    for i in range(3):
+        analises[19 + i][9] = ATIVOS[i]
+        analises[19 + i][14] = ATIVOS[-1 - i]
+
+    noticias = [["Horário", "Moeda", "Impacto", "Evento"]]
+    for i in range(40):
+        noticias.append([f"{(i * 37 // 60) % 24:02d}:{(i * 37) % 60:02d}", "USD", str(1 + i % 3), f"Evento {i}"])
+
+    auto = [["Sinais automáticos"], ["Data", "Horário", "Ativo", "Direção", "Resultado", "Gale"]]
+
+    return FakeSpreadsheet("Trade", {
+        "ANALISES": FakeWorksheet("ANALISES", analises, latencia),
+        "NOTICIAS": FakeWorksheet("NOTICIAS", noticias, latencia),
+        "Auto": FakeWorksheet("Auto", auto, latencia),
+    })
+
+
+class FakeMessage:
+    def __init__(self, id: int, message: str, date: datetime, chat_id: int = GRUPO_ID):
+        self.id = id
+        self.message = message
+        self.raw_text = message
+        self.date = date
+        self.chat_id = chat_id
+
+
+class FakeNewMessageEvent:
+    def __init__(self, message: FakeMessage):
+        self.message = message
+        self.raw_text = message.raw_text
+        self.chat_id = message.chat_id
+
+
+class FakeTelegramClient:
+    """Cliente Telethon em memória: iter_messages, on(NewMessage) e eventos enfileirados."""
+
+    def __init__(self, mensagens=None, eventos=None, *args, **kwargs):
+        self.mensagens = list(mensagens or [])   # mais recente primeiro, como no Telethon
+        self.eventos = list(eventos or [])
+        self.handlers = []
+        self.latencias = []
+        self.ignorados = 0
+
+    async def start(self):
+        return self
+
+    async def disconnect(self):
+        return None
+
+    async def iter_messages(self, entity, limit=None, min_id=0):
+        mensagens = [m for m in self.mensagens if m.id > min_id] if min_id else self.mensagens
+        for mensagem in mensagens[:limit]:
+            yield mensagem
+            await asyncio.sleep(0)
+
+    def on(self, event_builder):
+        def decorator(func):
+            self.handlers.append((event_builder, func))
+            return func
+        return decorator
+
+    @staticmethod
+    def _aceita(event_builder, chat_id) -> bool:
+        # Mesma semântica de chats=/blacklist_chats= dos EventBuilder do Telethon, só com ids numéricos
+        chats = getattr(event_builder, "chats", None)
+        if chats is None:
+            return True
+        if not isinstance(chats, (list, tuple, set)):
+            chats = [chats]
+        dentro = chat_id in {int(c) for c in chats}
+        return not dentro if getattr(event_builder, "blacklist_chats", False) else dentro
+
+    async def disparar(self, mensagem: FakeMessage):
+        evento = FakeNewMessageEvent(mensagem)
+        for event_builder, handler in self.handlers:
+            if not self._aceita(event_builder, mensagem.chat_id):
+                self.ignorados += 1
+                continue
+            inicio = time.perf_counter()
+            await handler(evento)
+            self.latencias.append(time.perf_counter() - inicio)
+
+    async def run_until_disconnected(self):
+        for mensagem in self.eventos:
+            await self.disparar(mensagem)
+
+
+def mensagem_resultado(ativo: str, horario: str, direcao: str, resultado: str) -> str:
+    return f"✅ {ativo} - {horario} - M1 - {direcao} - {resultado}"
+
+
+def mensagem_abertura(ativo: str, horario: str, direcao: str) -> str:
+    return f"📊 NOVO SINAL\nAtivo: {ativo}\nHorário: {horario}\nDireção: {direcao}\nExpiração: M1"
+
+
+def gerar_historico(quantidade: int, inicio: datetime = None):
+    """Gera mensagens de resultado (mais recente primeiro), uma por minuto."""
+    inicio = inicio or datetime(2025, 6, 26, 12, 0, tzinfo=pytz.UTC)
+    mensagens = []
+    for i in range(quantidade):
+        data = inicio - timedelta(minutes=i)
+        horario = (data - timedelta(minutes=1)).strftime("%H:%M:00")
+        texto = mensagem_resultado(ATIVOS[i % len(ATIVOS)], horario, "call" if i % 2 else "put", "WIN" if i % 3 else "LOSS")
+        mensagens.append(FakeMessage(quantidade - i, texto, data))
+    return mensagens
+
+
+def gerar_aberturas(quantidade: int, inicio: datetime = None, chat_id: int = GRUPO_ID):
+    """Gera mensagens de abertura com pares (ativo, minuto) distintos."""
+    inicio = inicio or datetime(2025, 6, 26, 12, 0, tzinfo=pytz.UTC)
+    mensagens = []
+    for i in range(quantidade):
+        data = inicio + timedelta(minutes=i)
+        horario = (data + timedelta(minutes=2)).strftime("%H:%M:00")
+        texto = mensagem_abertura(ATIVOS[i % len(ATIVOS)], horario, "call" if i % 2 else "put")
+        mensagens.append(FakeMessage(i + 1, texto, data, chat_id))
+    return mensagens
+
+
+class FakeResponse:
+    def __init__(self, text: str = "", status_code: int = 200, json_data=None):
+        self.text = text
+        self.status_code = status_code
+        self._json = json_data if json_data is not None else {}
+
+    def json(self):
+        return self._json
+
+
+class FakeHttp:
+    """Atende requests.get (calendário salvo) e requests.post (sendMessage da Bot API)."""
+
+    def __init__(self, html_calendario: str = None, latencia: float = 0.0):
+        if html_calendario is None:
+            html_calendario = FIXTURE_CALENDARIO.read_text(encoding="utf-8")
+        self.html_calendario = html_calendario
+        self.latencia = latencia
+        self.mensagens_enviadas = []
+
+    def get(self, url, *args, **kwargs):
+        if self.latencia:
+            time.sleep(self.latencia)
+        return FakeResponse(self.html_calendario)
+
+    def post(self, url, data=None, *args, **kwargs):
+        if self.latencia:
+            time.sleep(self.latencia)
+        if not url.endswith("/sendMessage"):
+            return FakeResponse(status_code=404, json_data={"ok": False})
+        data = data or kwargs.get("json") or {}
+        self.mensagens_enviadas.append(data)
+        return FakeResponse(json_data={"ok": True, "result": {"message_id": len(self.mensagens_enviadas), "text": data.get("text")}})
+
+
+@contextmanager
+def ambiente_simulado(planilha: FakeSpreadsheet = None, http: FakeHttp = None):
+    """Redireciona gspread, credenciais e requests para os substitutos locais."""
+    planilha = planilha or planilha_trade_fake()
+    http = http or FakeHttp()
+    cliente = FakeGspreadClient({planilha.title: planilha})
+    with ExitStack() as stack:
+        stack.enter_context(mock.patch.object(Credentials, "from_service_account_file", lambda *a, **k: object()))
+        stack.enter_context(mock.patch.object(gspread, "authorize", lambda *a, **k: cliente))
+        stack.enter_context(mock.patch.object(requests, "get", http.get))
+        stack.enter_context(mock.patch.object(requests, "post", http.post))
+        yield planilha, http